@@ -0,0 +1,203 @@
+import json
+import os
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.csv as pacsv
+import pyarrow.parquet as pq
+import streamlit as st
+import plotly.express as px
+import plotly.graph_objects as go
+from plotly.subplots import make_subplots
+
+# Shared by prepare_data.py, dashboard.py and dashboard22.py
+
+# =========================
+# Paths
+# =========================
+DATA_DIR = os.path.join(os.path.dirname(__file__), "data")
+
+THEME_CSV = os.path.join(DATA_DIR, "amazon_books_reviews_with_merged_categories.csv")
+# Cleaned (year, merged_category) rows
+THEME_PARQUET = os.path.join(DATA_DIR, "theme_clean.parquet")
+# (year, merged_category, count): all the thematic charts need
+AGG_THEME_YEAR_CATEGORY = os.path.join(DATA_DIR, "agg_theme_year_category.parquet")
+BAD_THEME_CATS = {"other", "great book", "good book", "nice book"}
+
+# Global-trend figure: (agg_year column, kind, title) per panel, two panels per row
+TREND_PANELS = [
+    ("review_count", "bar", "Number of Reviews Per Year"),
+    ("avg_rating", "line", "Average Rating Per Year"),
+    ("avg_text_len", "line", "Average Review Length by Year"),
+    ("avg_sentiment", "line", "Average Sentiment Score Per Year"),
+    ("avg_helpful_vote", "line", "Average Helpful Votes by Year"),
+    ("avg_price", "line", "Average Book Price"),
+]
+
+def file_key(path: str) -> tuple:
+    # (path, mtime) cache key
+    return (path, os.stat(path).st_mtime_ns if os.path.exists(path) else None)
+
+def year_slice(agg: pa.Table, year_range, year_col="year"):
+    if agg is None or not year_range or year_col not in agg.column_names:
+        return agg
+    mask = pc.and_(pc.greater_equal(agg[year_col], year_range[0]), pc.less_equal(agg[year_col], year_range[1]))
+    return agg.filter(mask)
+
+# =========================
+# Global trends
+# =========================
+def trends_figure(frames: list) -> go.Figure:
+    # frames: one (year, column) frame or None per TREND_PANELS entry
+    fig = make_subplots(rows=3, cols=2, subplot_titles=[p[2] for p in TREND_PANELS])
+    for i, ((y, kind, title), a) in enumerate(zip(TREND_PANELS, frames)):
+        if a is None or y not in a.columns:
+            continue
+        if kind == "bar":
+            trace = go.Bar(x=a["year"], y=a[y], name=title)
+        else:
+            trace = go.Scattergl(x=a["year"], y=a[y], mode="lines+markers", name=title)
+        fig.add_trace(trace, row=i // 2 + 1, col=i % 2 + 1)
+    fig.update_layout(showlegend=False, height=900)
+    return fig
+
+@st.cache_data
+def build_trends_figure(_tables, keys, year_range=None) -> dict:
+    # _tables: the loaded aggregate per TREND_PANELS entry; keys: their file keys
+    frames = [
+        None if t is None or not {"year", y}.issubset(t.column_names)
+        else year_slice(t, year_range).select(["year", y]).to_pandas()
+        for t, (y, _, _) in zip(_tables, TREND_PANELS)
+    ]
+    return trends_figure(frames).to_dict()
+
+@st.cache_data
+def load_fig_json(path: str, mtime: int) -> dict:
+    with open(path) as f:
+        return json.load(f)
+
+def global_trends_fig(tables: list, keys: tuple, fig_path: str, year_range, full_range) -> dict:
+    # Prebuilt figure: full range only, and not older than agg_year.parquet (keys[0])
+    fig_key = file_key(fig_path)
+    fresh = fig_key[1] is not None and keys[0][1] is not None and fig_key[1] >= keys[0][1]
+    if fresh and (not year_range or tuple(year_range) == tuple(full_range)):
+        return load_fig_json(*fig_key)
+    return build_trends_figure(tables, keys, tuple(year_range) if year_range else None)
+
+# =========================
+# Thematic categories
+# =========================
+def clean_theme_csv(path: str) -> pa.Table:
+    # (year int16, merged_category), placeholder labels and bad years dropped
+    t = pacsv.read_csv(
+        path,
+        convert_options=pacsv.ConvertOptions(
+            include_columns=["year", "merged_category"],
+            column_types={"year": pa.string(), "merged_category": pa.string()},
+            strings_can_be_null=True,
+        ),
+    )
+    cat = pc.utf8_trim_whitespace(t["merged_category"])
+    bad = pc.is_in(pc.utf8_lower(cat), value_set=pa.array(sorted(BAD_THEME_CATS)))
+    d = pa.table({"year": t["year"], "merged_category": cat}).filter(
+        pc.and_(pc.not_equal(cat, ""), pc.invert(bad))
+    ).to_pandas()
+    year = pd.to_numeric(d["year"], errors="coerce")
+    keep = year.notna()
+    return pa.table({
+        "year": pa.array(year[keep].astype("int16")),
+        "merged_category": pa.array(d["merged_category"][keep]),
+    })
+
+def count_theme_rows(t: pa.Table) -> pd.DataFrame:
+    # (year, merged_category, count), sorted by year then category
+    counts = (
+        t.group_by(["year", "merged_category"]).aggregate([([], "count_all")])
+        .rename_columns(["year", "merged_category", "count"])
+    )
+    # Dictionary keys decoded
+    if pa.types.is_dictionary(counts.schema.field("merged_category").type):
+        counts = counts.set_column(1, "merged_category", counts["merged_category"].cast(pa.string()))
+    return counts.to_pandas().sort_values(["year", "merged_category"], ignore_index=True)
+
+def theme_key() -> tuple:
+    # Counts, else cleaned Parquet, else CSV; skipped when older than the CSV
+    csv_key = file_key(THEME_CSV)
+    for key in (file_key(AGG_THEME_YEAR_CATEGORY), file_key(THEME_PARQUET)):
+        if key[1] is not None and (csv_key[1] is None or key[1] >= csv_key[1]):
+            return key
+    return csv_key
+
+@st.cache_resource
+def load_theme(path: str, mtime: int) -> pd.DataFrame:
+    # Shared and read-only downstream; merged_category as a Categorical
+    if path == THEME_PARQUET:
+        return pq.read_table(
+            path, columns=["year", "merged_category"], read_dictionary=["merged_category"]
+        ).to_pandas()
+    # Raw CSV: cleaned in memory
+    d = clean_theme_csv(path).to_pandas()
+    d["merged_category"] = d["merged_category"].astype("category")
+    return d
+
+# Keyed on the theme source's file key
+@st.cache_data(persist="disk", show_spinner=False)
+def theme_year_counts(path: str, mtime: int) -> pd.DataFrame:
+    if path == AGG_THEME_YEAR_CATEGORY:
+        return pd.read_parquet(path)
+    return count_theme_rows(pa.Table.from_pandas(load_theme(path, mtime), preserve_index=False))
+
+@st.cache_data(persist="disk", show_spinner=False)
+def theme_pivot(path: str, mtime: int) -> pd.DataFrame:
+    # Year x category count matrix
+    counts = theme_year_counts(path, mtime)
+    yc, years = pd.factorize(counts["year"], sort=True)
+    cc, cats = pd.factorize(counts["merged_category"], sort=True)
+    mat = np.zeros((len(years), len(cats)), dtype=np.int32)
+    mat[yc, cc] = counts["count"].to_numpy()
+    return pd.DataFrame(mat, index=pd.Index(years, name="year"), columns=pd.Index(cats, name="merged_category"))
+
+@st.cache_data(persist="disk", max_entries=32, show_spinner=False)
+def theme_row_total(path: str, mtime: int, year_range: tuple) -> int:
+    # Labelled reviews in the selected years
+    return int(theme_pivot(path, mtime).loc[year_range[0]:year_range[1]].to_numpy().sum())
+
+@st.cache_data(persist="disk", max_entries=32, show_spinner=False)
+def theme_top_pivot(path: str, mtime: int, year_range: tuple, top_n: int) -> pd.DataFrame:
+    # Selected years x top N categories, in the pivot's sorted column order
+    sl = theme_pivot(path, mtime).loc[year_range[0]:year_range[1]]
+    top_cats = sl.sum().nlargest(top_n).index
+    return sl.loc[:, sl.columns.isin(top_cats)]
+
+@st.cache_data(max_entries=32)
+def theme_view_fig(path: str, mtime: int, year_range: tuple, top_n: int, view: str) -> dict:
+    sl = theme_top_pivot(path, mtime, year_range, top_n)
+    if view == "Heatmap":
+        fig = px.imshow(
+            sl,
+            aspect="auto",
+            labels=dict(x="Thematic Category", y="Year", color="Count"),
+        )
+        fig.update_layout(height=650)
+        return fig.to_dict()
+
+    # One trace per category column
+    years, mat = sl.index.to_numpy(), sl.to_numpy()
+    if view == "Stacked proportions":
+        totals = mat.sum(axis=1, keepdims=True)
+        props = np.divide(mat, totals, out=np.zeros(mat.shape), where=totals > 0)
+        fig = go.Figure([go.Bar(name=c, x=years, y=props[:, i]) for i, c in enumerate(sl.columns)])
+        fig.update_layout(barmode="stack")
+        fig.update_yaxes(title="Proportion")
+    else:
+        # Zero cells left out (log axis)
+        fig = go.Figure([
+            go.Scattergl(name=c, x=years[mat[:, i] > 0], y=mat[mat[:, i] > 0, i], mode="lines+markers")
+            for i, c in enumerate(sl.columns)
+        ])
+        fig.update_yaxes(type="log", title="Number of Reviews (log)")
+    fig.update_xaxes(title="Year")
+    fig.update_layout(legend_title_text="Thematic Category", height=600)
+    return fig.to_dict()
@@ -1,11 +1,30 @@
 import os
-import pandas as pd
+from concurrent.futures import ThreadPoolExecutor
+
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
 import streamlit as st
 import plotly.express as px
 
 import boto3
+from boto3.s3.transfer import TransferConfig
+from botocore.config import Config
 from botocore.exceptions import ClientError
 
+from common import (
+    AGG_THEME_YEAR_CATEGORY,
+    THEME_CSV,
+    THEME_PARQUET,
+    file_key,
+    global_trends_fig,
+    theme_key,
+    theme_row_total,
+    theme_view_fig,
+    theme_year_counts,
+    year_slice,
+)
+
 # =========================
 # Page config (must be first Streamlit call)
 # =========================
@@ -26,24 +45,67 @@ AGG_SENTIMENT_LABELS     = os.path.join(DATA_DIR, "agg_sentiment_labels.parquet"
 AGG_HELPFUL_PER_YEAR     = os.path.join(DATA_DIR, "agg_helpful_per_year.parquet")
 AGG_TEXTLEN_PER_YEAR     = os.path.join(DATA_DIR, "agg_textlen_per_year.parquet")
 AGG_PRICE_PER_YEAR       = os.path.join(DATA_DIR, "agg_price_per_year.parquet")
-
-THEME_CSV = os.path.join(DATA_DIR, "amazon_books_reviews_with_merged_categories.csv")
-BAD_THEME_CATS = {"other", "great book", "good book", "nice book"}
+AGG_YEAR                 = os.path.join(DATA_DIR, "agg_year.parquet")
+
+# Columns read from each aggregate
+AGG_COLUMNS = {
+    AGG_REVIEWS_PER_YEAR: ["year", "review_count"],
+    AGG_RATING_PER_YEAR: ["year", "avg_rating"],
+    AGG_SENTIMENT_PER_YEAR: ["year", "avg_sentiment"],
+    AGG_HELPFUL_PER_YEAR: ["year", "avg_helpful_vote"],
+    AGG_TEXTLEN_PER_YEAR: ["year", "avg_text_len"],
+    AGG_PRICE_PER_YEAR: ["year", "avg_price"],
+    AGG_YEAR: ["year", "review_count", "avg_rating", "avg_sentiment", "avg_helpful_vote", "avg_text_len", "avg_price"],
+    AGG_SENTIMENT_LABELS: ["year", "sentiment_label", "count"],
+}
+
+# Prebuilt global-trend figure written by prepare_data.py (optional)
+FIG_TRENDS               = os.path.join(DATA_DIR, "fig_trends.json")
+
+
+# Older bucket layouts, tried in order when a file is missing
+REQUIRED_FALLBACKS = {
+    "agg_year.parquet": (
+        "agg_reviews_per_year.parquet",
+        "agg_rating_per_year.parquet",
+        "agg_sentiment_per_year.parquet",
+        "agg_helpful_per_year.parquet",
+        "agg_textlen_per_year.parquet",
+        "agg_price_per_year.parquet",
+    ),
+    "agg_theme_year_category.parquet": ("theme_clean.parquet",),
+    "theme_clean.parquet": ("amazon_books_reviews_with_merged_categories.csv",),
+}
 
 REQUIRED_FILES = [
-    "agg_reviews_per_year.parquet",
-    "agg_rating_per_year.parquet",
-    "agg_sentiment_per_year.parquet",
+    "agg_year.parquet",
     "agg_sentiment_labels.parquet",
-    "agg_helpful_per_year.parquet",
-    "agg_textlen_per_year.parquet",
-    "agg_price_per_year.parquet",
-    "amazon_books_reviews_with_merged_categories.csv",
+    "agg_theme_year_category.parquet",
+]
+
+# Downloaded when present in the bucket
+OPTIONAL_FILES = [
+    "fig_trends.json",
 ]
 
 # =========================
 # S3 download (runs once per container)
 # =========================
+MB = 1024 * 1024
+# Large objects fetched as parallel ranged GETs
+S3_TRANSFER = TransferConfig(multipart_threshold=8 * MB, multipart_chunksize=16 * MB, max_concurrency=10, use_threads=True)
+
+@st.cache_resource
+def get_s3_client(access_key: str, secret_key: str, region: str):
+    # Shared by the download threads
+    return boto3.client(
+        "s3",
+        aws_access_key_id=access_key,
+        aws_secret_access_key=secret_key,
+        region_name=region,
+        config=Config(max_pool_connections=32),
+    )
+
 def s3_download_if_missing():
     required_secrets = ["S3_BUCKET", "AWS_ACCESS_KEY_ID", "AWS_SECRET_ACCESS_KEY"]
     missing = [k for k in required_secrets if k not in st.secrets]
@@ -59,24 +121,38 @@ def s3_download_if_missing():
     prefix = st.secrets.get("S3_PREFIX", "data").strip("/")
     region = st.secrets.get("AWS_DEFAULT_REGION", "us-east-1")
 
-    s3 = boto3.client(
-        "s3",
-        aws_access_key_id=st.secrets["AWS_ACCESS_KEY_ID"],
-        aws_secret_access_key=st.secrets["AWS_SECRET_ACCESS_KEY"],
-        region_name=region,
-    )
+    s3 = get_s3_client(st.secrets["AWS_ACCESS_KEY_ID"], st.secrets["AWS_SECRET_ACCESS_KEY"], region)
 
-    for fname in REQUIRED_FILES:
-        local_path = os.path.join(DATA_DIR, fname)
-        if os.path.exists(local_path):
-            continue
+    todo = [f for f in REQUIRED_FILES + OPTIONAL_FILES if not os.path.exists(os.path.join(DATA_DIR, f))]
+    if not todo:
+        return
 
+    def download(fname):
         key = f"{prefix}/{fname}" if prefix else fname
         try:
-            s3.download_file(bucket, key, local_path)
+            s3.download_file(bucket, key, os.path.join(DATA_DIR, fname), Config=S3_TRANSFER)
         except ClientError as e:
-            st.error(f"Failed to download s3://{bucket}/{key}\n{e}")
-            st.stop()
+            return fname, key, e
+        return fname, key, None
+
+    # Concurrent downloads; Streamlit calls stay on the script thread
+    failed = []
+    with ThreadPoolExecutor(max_workers=8) as ex:
+        for fname, key, e in list(ex.map(download, todo)):
+            if e is None or fname in OPTIONAL_FILES:
+                continue
+            # Walk the older layouts until one is complete
+            alt = REQUIRED_FALLBACKS.get(fname)
+            while alt:
+                missing = [a for a in alt if not os.path.exists(os.path.join(DATA_DIR, a))]
+                if all(err is None for _, _, err in ex.map(download, missing)):
+                    break
+                alt = REQUIRED_FALLBACKS.get(alt[0])
+            if not alt:
+                failed.append((fname, key, e))
+    if failed:
+        st.error("\n".join(f"Failed to download s3://{bucket}/{key}\n{e}" for _, key, e in failed))
+        st.stop()
 
 # Avoid re-downloading on every widget interaction
 if "data_ready" not in st.session_state:
@@ -86,115 +162,118 @@ if "data_ready" not in st.session_state:
 # =========================
 # Loaders
 # =========================
-@st.cache_data
-def load_parquet(path: str) -> pd.DataFrame:
-    return pd.read_parquet(path)
-
-@st.cache_data
-def load_theme_csv(path: str) -> pd.DataFrame:
-    d = pd.read_csv(path)
-    d["year"] = pd.to_numeric(d.get("year"), errors="coerce")
-    d = d.dropna(subset=["year", "merged_category"]).copy()
-    d["year"] = d["year"].astype(int)
-    d["merged_category"] = d["merged_category"].astype(str).str.strip()
-    d = d[~d["merged_category"].str.lower().isin(BAD_THEME_CATS)]
-    d = d[d["merged_category"] != ""].reset_index(drop=True)
-    return d
+def load_optional_parquet(key: tuple):
+    path, mtime = key
+    if mtime is None:
+        return None
+    # Charted columns only
+    pf = pq.ParquetFile(path, memory_map=True)
+    columns = AGG_COLUMNS.get(path)
+    if columns:
+        columns = [c for c in columns if c in pf.schema_arrow.names]
+    t = pf.read(columns=columns)
+    # Older files narrowed to prepare_data.py's dtypes
+    for i, f in enumerate(t.schema):
+        if f.name == "year" and f.type != pa.int16():
+            t = t.set_column(i, f.name, pc.cast(t[f.name], pa.int16()))
+        elif f.type == pa.int64():
+            t = t.set_column(i, f.name, pc.cast(t[f.name], pa.int32()))
+        elif f.type == pa.float64():
+            t = t.set_column(i, f.name, pc.cast(t[f.name], pa.float32()))
+    return t
+
+def year_bounds(tables: list):
+    lo, hi = None, None
+    for t in tables:
+        if t is None or "year" not in t.column_names:
+            continue
+        mm = pc.min_max(t["year"])
+        if not mm["min"].is_valid:
+            continue
+        lo = int(mm["min"].as_py()) if lo is None else min(lo, int(mm["min"].as_py()))
+        hi = int(mm["max"].as_py()) if hi is None else max(hi, int(mm["max"].as_py()))
+    return None if lo is None else (lo, hi)
+
+@st.cache_resource
+def load_aggregates(keys: tuple) -> tuple:
+    # Read in parallel
+    with ThreadPoolExecutor(max_workers=len(keys)) as ex:
+        tables = list(ex.map(load_optional_parquet, keys))
+    # Slider bounds from the loaded tables
+    return tables, year_bounds(tables)
 
 # =========================
 # Title
 # =========================
 st.title("Amazon Books Reviews — Interactive Dashboard")
-st.caption("This dashboard uses pre-aggregated files (low memory) + thematic category CSV.")
+st.caption("This dashboard uses pre-aggregated files (low memory) + pre-counted thematic categories.")
 
 # =========================
 # Load aggregates
 # =========================
-agg_reviews = load_parquet(AGG_REVIEWS_PER_YEAR) if os.path.exists(AGG_REVIEWS_PER_YEAR) else None
-agg_rating  = load_parquet(AGG_RATING_PER_YEAR) if os.path.exists(AGG_RATING_PER_YEAR) else None
-agg_sent    = load_parquet(AGG_SENTIMENT_PER_YEAR) if os.path.exists(AGG_SENTIMENT_PER_YEAR) else None
-agg_labels  = load_parquet(AGG_SENTIMENT_LABELS) if os.path.exists(AGG_SENTIMENT_LABELS) else None
-agg_helpful = load_parquet(AGG_HELPFUL_PER_YEAR) if os.path.exists(AGG_HELPFUL_PER_YEAR) else None
-agg_textlen = load_parquet(AGG_TEXTLEN_PER_YEAR) if os.path.exists(AGG_TEXTLEN_PER_YEAR) else None
-agg_price   = load_parquet(AGG_PRICE_PER_YEAR) if os.path.exists(AGG_PRICE_PER_YEAR) else None
-
-def available_years(*dfs):
-    yrs = set()
-    for d in dfs:
-        if d is not None and "year" in d.columns:
-            y = pd.to_numeric(d["year"], errors="coerce").dropna().astype(int).unique().tolist()
-            yrs.update(y)
-    return sorted(yrs)
-
-years = available_years(agg_reviews, agg_rating, agg_sent, agg_labels, agg_helpful, agg_textlen, agg_price)
+# Wide per-year table, else the single-metric files
+if os.path.exists(AGG_YEAR):
+    (agg_year, agg_labels), bounds = load_aggregates(tuple(file_key(p) for p in (AGG_YEAR, AGG_SENTIMENT_LABELS)))
+    agg_reviews = agg_rating = agg_sent = agg_helpful = agg_textlen = agg_price = agg_year
+else:
+    aggs, bounds = load_aggregates(tuple(file_key(p) for p in (
+        AGG_REVIEWS_PER_YEAR,
+        AGG_RATING_PER_YEAR,
+        AGG_SENTIMENT_PER_YEAR,
+        AGG_SENTIMENT_LABELS,
+        AGG_HELPFUL_PER_YEAR,
+        AGG_TEXTLEN_PER_YEAR,
+        AGG_PRICE_PER_YEAR,
+    )))
+    agg_reviews, agg_rating, agg_sent, agg_labels, agg_helpful, agg_textlen, agg_price = aggs
 
 st.sidebar.header("Filters")
-if years:
-    y_min, y_max = min(years), max(years)
-    year_range = st.sidebar.slider("Year range", y_min, y_max, (y_min, y_max), key="year_range")
+if bounds:
+    # Submitted on "Apply" only
+    with st.sidebar.form("filters"):
+        y_min, y_max = bounds
+        year_range = st.slider("Year range", y_min, y_max, (y_min, y_max), key="year_range")
+        st.form_submit_button("Apply")
 else:
     year_range = None
     st.sidebar.info("No year data found in aggregates.")
 
-def apply_year_filter(agg: pd.DataFrame, year_col="year"):
-    if agg is None or not year_range or year_col not in agg.columns:
-        return agg
-    a = agg.copy()
-    a[year_col] = pd.to_numeric(a[year_col], errors="coerce")
-    return a[(a[year_col] >= year_range[0]) & (a[year_col] <= year_range[1])]
-
 # =========================
 # Global trends
 # =========================
-col1, col2 = st.columns(2)
-
-with col1:
-    if agg_reviews is not None and {"year", "review_count"}.issubset(agg_reviews.columns):
-        a = apply_year_filter(agg_reviews)
-        fig = px.bar(a, x="year", y="review_count", title="Number of Reviews Per Year")
-        st.plotly_chart(fig, use_container_width=True, key="reviews_per_year")
-
-    if agg_textlen is not None and {"year", "avg_text_len"}.issubset(agg_textlen.columns):
-        a = apply_year_filter(agg_textlen)
-        fig = px.line(a, x="year", y="avg_text_len", markers=True, title="Average Review Length by Year")
-        st.plotly_chart(fig, use_container_width=True, key="avg_text_len_per_year")
-
-    if agg_helpful is not None and {"year", "avg_helpful_vote"}.issubset(agg_helpful.columns):
-        a = apply_year_filter(agg_helpful)
-        fig = px.line(a, x="year", y="avg_helpful_vote", markers=True, title="Average Helpful Votes by Year")
-        st.plotly_chart(fig, use_container_width=True, key="avg_helpful_votes_per_year")
-
-with col2:
-    if agg_rating is not None and {"year", "avg_rating"}.issubset(agg_rating.columns):
-        a = apply_year_filter(agg_rating)
-        fig = px.line(a, x="year", y="avg_rating", markers=True, title="Average Rating Per Year")
-        st.plotly_chart(fig, use_container_width=True, key="avg_rating_per_year")
-
-    if agg_sent is not None and {"year", "avg_sentiment"}.issubset(agg_sent.columns):
-        a = apply_year_filter(agg_sent)
-        fig = px.line(a, x="year", y="avg_sentiment", markers=True, title="Average Sentiment Score Per Year")
-        st.plotly_chart(fig, use_container_width=True, key="avg_sentiment_per_year")
-
-    if agg_price is not None and {"year", "avg_price"}.issubset(agg_price.columns):
-        a = apply_year_filter(agg_price)
-        fig = px.line(a, x="year", y="avg_price", markers=True, title="Average Book Price")
-        st.plotly_chart(fig, use_container_width=True, key="avg_price_per_year")
-
+# Prebuilt figure for the full range, else built from the sliced aggregates
+trends_fig = global_trends_fig([agg_reviews, agg_rating, agg_textlen, agg_sent, agg_helpful, agg_price], tuple(file_key(p) for p in (
+    AGG_YEAR,
+    AGG_REVIEWS_PER_YEAR,
+    AGG_RATING_PER_YEAR,
+    AGG_SENTIMENT_PER_YEAR,
+    AGG_HELPFUL_PER_YEAR,
+    AGG_TEXTLEN_PER_YEAR,
+    AGG_PRICE_PER_YEAR,
+)), FIG_TRENDS, year_range, bounds)
+st.plotly_chart(trends_fig, use_container_width=True, key="global_trends")
 st.divider()
 
 # =========================
 # Sentiment label trends (from agg)
 # =========================
-if agg_labels is not None and {"year", "sentiment_label", "count"}.issubset(agg_labels.columns):
-    a = apply_year_filter(agg_labels)
+# Keyed on the file key and year range (_agg not hashed)
+@st.cache_data
+def sentiment_label_fig(_agg, key, year_range) -> dict:
+    # Cached as a plain dict
     fig = px.line(
-        a,
+        year_slice(_agg, year_range).to_pandas(),
         x="year",
         y="count",
         color="sentiment_label",
         markers=True,
+        render_mode="webgl",
         title="Sentiment Label Trends Over Years",
     )
+    return fig.to_dict()
+
+if agg_labels is not None and {"year", "sentiment_label", "count"}.issubset(agg_labels.column_names):
+    fig = sentiment_label_fig(agg_labels, file_key(AGG_SENTIMENT_LABELS), year_range)
     st.plotly_chart(fig, use_container_width=True, key="sentiment_label_trends_agg")
 
 st.divider()
@@ -204,83 +283,42 @@ st.divider()
 # =========================
 st.header("Thematic Categories")
 
-if not os.path.exists(THEME_CSV):
-    st.warning(f"Thematic CSV not found: {THEME_CSV}")
-else:
-    theme_df = load_theme_csv(THEME_CSV)
+@st.fragment
+def theme_section(theme_src: tuple):
+    # Fragment: the thematic controls rerun only this section
+    theme_counts_all = theme_year_counts(*theme_src)
 
-    with st.sidebar.expander("Thematic Categories", expanded=False):
+    with st.expander("Thematic filters", expanded=False):
         theme_top_n = st.slider("Top N thematic categories", 5, 28, 20, 1, key="theme_top_n")
-        tmin, tmax = int(theme_df["year"].min()), int(theme_df["year"].max())
+        tmin, tmax = int(theme_counts_all["year"].min()), int(theme_counts_all["year"].max())
         theme_year_range = st.slider("Thematic year range", tmin, tmax, (tmin, tmax), 1, key="theme_year_range")
 
-    theme_df_f = theme_df[
-        (theme_df["year"] >= theme_year_range[0]) &
-        (theme_df["year"] <= theme_year_range[1])
-    ].copy()
+    theme_rows = theme_row_total(*theme_src, theme_year_range)
 
-    st.caption(f"Thematic rows: {len(theme_df_f):,}")
+    st.caption(f"Thematic rows: {theme_rows:,}")
 
-    theme_overall_counts = theme_df_f["merged_category"].value_counts()
-    theme_top_cats = theme_overall_counts.head(theme_top_n).index.tolist()
-    theme_df_top = theme_df_f[theme_df_f["merged_category"].isin(theme_top_cats)].copy()
-
-    theme_counts_long = (
-        theme_df_top.groupby(["year", "merged_category"])
-        .size()
-        .reset_index(name="count")
-    )
-
-    theme_counts_pivot = (
-        theme_counts_long.pivot(index="year", columns="merged_category", values="count")
-        .fillna(0)
-        .sort_index()
+    # Only the selected view is built
+    theme_view = st.radio(
+        "Thematic chart",
+        ["Line (log)", "Stacked proportions", "Heatmap"],
+        horizontal=True,
+        label_visibility="collapsed",
+        key="theme_view",
     )
 
-    tab1, tab2, tab3 = st.tabs(["Line (log)", "Stacked proportions", "Heatmap"])
-
-    with tab1:
+    fig = theme_view_fig(*theme_src, theme_year_range, theme_top_n, theme_view)
+    if theme_view == "Line (log)":
         st.subheader("Review Counts per Thematic Category over Years (log scale)")
-        fig_line = px.line(
-            theme_counts_long,
-            x="year",
-            y="count",
-            color="merged_category",
-            markers=True,
-        )
-        fig_line.update_yaxes(type="log", title="Number of Reviews (log)")
-        fig_line.update_xaxes(title="Year")
-        fig_line.update_layout(legend_title_text="Thematic Category", height=600)
-        st.plotly_chart(fig_line, use_container_width=True, key="theme_line_log")
-
-    with tab2:
+        st.plotly_chart(fig, use_container_width=True, key="theme_line_log")
+    elif theme_view == "Stacked proportions":
         st.subheader("Thematic Category Proportions per Year (stacked)")
-        year_totals = theme_counts_pivot.sum(axis=1).replace(0, 1)
-        theme_props_pivot = theme_counts_pivot.div(year_totals, axis=0)
-
-        theme_props_long = (
-            theme_props_pivot.reset_index()
-            .melt(id_vars="year", var_name="merged_category", value_name="proportion")
-        )
-
-        fig_stack = px.bar(
-            theme_props_long,
-            x="year",
-            y="proportion",
-            color="merged_category",
-            barmode="stack",
-        )
-        fig_stack.update_yaxes(title="Proportion")
-        fig_stack.update_xaxes(title="Year")
-        fig_stack.update_layout(legend_title_text="Thematic Category", height=600)
-        st.plotly_chart(fig_stack, use_container_width=True, key="theme_stacked_props")
-
-    with tab3:
+        st.plotly_chart(fig, use_container_width=True, key="theme_stacked_props")
+    else:
         st.subheader("Counts Heatmap (Year × Thematic Category)")
-        fig_heat = px.imshow(
-            theme_counts_pivot,
-            aspect="auto",
-            labels=dict(x="Thematic Category", y="Year", color="Count"),
-        )
-        fig_heat.update_layout(height=650)
-        st.plotly_chart(fig_heat, use_container_width=True, key="theme_heatmap")
+        st.plotly_chart(fig, use_container_width=True, key="theme_heatmap")
+
+theme_src = theme_key()
+if theme_src[1] is None:
+    st.warning(f"Thematic data not found: {AGG_THEME_YEAR_CATEGORY} (or {THEME_PARQUET}, {THEME_CSV})")
+else:
+    theme_section(theme_src)
@@ -595,9 +595,29 @@
 
 
 import os
+from concurrent.futures import ThreadPoolExecutor
+
 import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
 import streamlit as st
 import plotly.express as px
+import plotly.graph_objects as go
+
+from common import (
+    AGG_THEME_YEAR_CATEGORY,
+    THEME_CSV,
+    THEME_PARQUET,
+    file_key,
+    global_trends_fig,
+    theme_key,
+    theme_row_total,
+    theme_view_fig,
+    theme_year_counts,
+    year_slice,
+)
 
 # =========================
 # Paths
@@ -612,26 +632,165 @@ AGG_SENTIMENT_LABELS = os.path.join(DATA_DIR, "agg_sentiment_labels.parquet")
 AGG_HELPFUL_PER_YEAR = os.path.join(DATA_DIR, "agg_helpful_per_year.parquet")
 AGG_TEXTLEN_PER_YEAR = os.path.join(DATA_DIR, "agg_textlen_per_year.parquet")
 AGG_PRICE_PER_YEAR = os.path.join(DATA_DIR, "agg_price_per_year.parquet")
+AGG_YEAR = os.path.join(DATA_DIR, "agg_year.parquet")
+AGG_FILTER_VALUES = os.path.join(DATA_DIR, "agg_filter_values.parquet")
+# Top-N-over-years sidecars (year, key, count), limited to the overall top 50 keys
+AGG_TOP_CATEGORIES_YEAR = os.path.join(DATA_DIR, "agg_top_categories_year.parquet")
+AGG_TOP_TITLES_YEAR = os.path.join(DATA_DIR, "agg_top_titles_year.parquet")
+AGG_TOP_AUTHORS_YEAR = os.path.join(DATA_DIR, "agg_top_authors_year.parquet")
+# Full (year, key, count) cubes for the single-category / single-author views
+AGG_YEAR_CATEGORY = os.path.join(DATA_DIR, "agg_year_category.parquet")
+AGG_YEAR_AUTHOR = os.path.join(DATA_DIR, "agg_year_author.parquet")
+
+# Prebuilt global-trend figure written by prepare_data.py (optional)
+FIG_TRENDS = os.path.join(DATA_DIR, "fig_trends.json")
 
-THEME_CSV = os.path.join(DATA_DIR, "amazon_books_reviews_with_merged_categories.csv")
-BAD_THEME_CATS = {"other", "great book", "good book", "nice book"}
 
 st.set_page_config(page_title="Amazon Books Dashboard", layout="wide")
 
+CATEGORY_COL = "category_level_3_detail"
+AUTHOR_COL = "author_name"
+# Low-cardinality string columns, read dictionary-encoded
+DICT_COLS = [CATEGORY_COL, AUTHOR_COL, "title", "sentiment_label"]
+# Narrower numeric types
+NARROW_TYPES = {
+    "year": pa.int16(),
+    "helpful_vote": pa.int32(),
+    "text_len": pa.int32(),
+    "sentiment": pa.float32(),
+    "price_numeric": pa.float32(),
+}
+
+# Columns read from each aggregate
+AGG_COLUMNS = {
+    AGG_REVIEWS_PER_YEAR: ["year", "review_count"],
+    AGG_RATING_PER_YEAR: ["year", "avg_rating"],
+    AGG_SENTIMENT_PER_YEAR: ["year", "avg_sentiment"],
+    AGG_HELPFUL_PER_YEAR: ["year", "avg_helpful_vote"],
+    AGG_TEXTLEN_PER_YEAR: ["year", "avg_text_len"],
+    AGG_PRICE_PER_YEAR: ["year", "avg_price"],
+    AGG_YEAR: ["year", "review_count", "avg_rating", "avg_sentiment", "avg_helpful_vote", "avg_text_len", "avg_price"],
+    AGG_SENTIMENT_LABELS: ["year", "sentiment_label", "count"],
+    AGG_YEAR_CATEGORY: ["year", CATEGORY_COL, "count"],
+    AGG_YEAR_AUTHOR: ["year", AUTHOR_COL, "count"],
+    AGG_TOP_CATEGORIES_YEAR: ["year", CATEGORY_COL, "count"],
+    AGG_TOP_TITLES_YEAR: ["year", "title", "count"],
+    AGG_TOP_AUTHORS_YEAR: ["year", AUTHOR_COL, "count"],
+}
+
+def load_optional_parquet(key: tuple):
+    path, mtime = key
+    if mtime is None:
+        return None
+    # Charted columns only
+    pf = pq.ParquetFile(path, memory_map=True)
+    columns = AGG_COLUMNS.get(path)
+    if columns:
+        columns = [c for c in columns if c in pf.schema_arrow.names]
+    t = pf.read(columns=columns)
+    # Older files narrowed to prepare_data.py's dtypes
+    for i, f in enumerate(t.schema):
+        if f.name == "year" and f.type != pa.int16():
+            t = t.set_column(i, f.name, pc.cast(t[f.name], pa.int16()))
+        elif f.type == pa.int64():
+            t = t.set_column(i, f.name, pc.cast(t[f.name], pa.int32()))
+        elif f.type == pa.float64():
+            t = t.set_column(i, f.name, pc.cast(t[f.name], pa.float32()))
+    return t
+
+@st.cache_resource
+def load_aggregates(keys: tuple) -> list:
+    # Read in parallel
+    with ThreadPoolExecutor(max_workers=len(keys)) as ex:
+        return list(ex.map(load_optional_parquet, keys))
+
+@st.cache_resource
+def load_processed_dataset(path: str) -> ds.Dataset:
+    # Scanned lazily, projected columns only
+    fmt = ds.ParquetFileFormat(read_options=ds.ParquetReadOptions(dictionary_columns=DICT_COLS))
+    file_schema = ds.dataset(path, format=fmt).schema
+    schema = pa.schema([f.with_type(NARROW_TYPES.get(f.name, f.type)) for f in file_schema])
+    return ds.dataset(path, format=fmt, schema=schema)
+
+def processed_filter(year_range, selected_cat="All", selected_author="All"):
+    conds = []
+    if year_range:
+        conds.append((ds.field("year") >= year_range[0]) & (ds.field("year") <= year_range[1]))
+    # Missing values are stored as "Unknown"
+    if selected_cat != "All":
+        conds.append(ds.field(CATEGORY_COL) == selected_cat)
+    if selected_author != "All":
+        conds.append(ds.field(AUTHOR_COL) == selected_author)
+    expr = None
+    for c in conds:
+        expr = c if expr is None else expr & c
+    return expr
+
+def arrow_dtype(t: pa.DataType):
+    # Dictionary columns as pandas categoricals
+    return None if pa.types.is_dictionary(t) else pd.ArrowDtype(t)
+
+def load_processed(path: str, columns: tuple, year_range=None, selected_cat="All", selected_author="All") -> pd.DataFrame:
+    # Requested columns and matching rows only
+    expr = processed_filter(year_range, selected_cat, selected_author)
+    table = load_processed_dataset(path).to_table(columns=list(columns), filter=expr)
+    return table.to_pandas(types_mapper=arrow_dtype)
+
+def top_n_year_series(counts: pd.DataFrame, col: str, n: int = 10) -> pd.DataFrame:
+    # Top N by per-key total
+    tops = counts.groupby(col, observed=True)["count"].sum().nlargest(n).index
+    # Keys outside the top N become NaN
+    keys = counts[col].astype("category").cat.set_categories(list(tops))
+    top = counts[keys.notna()].assign(**{col: keys})
+    return top.sort_values([col, "year"], ignore_index=True)
+
 @st.cache_data
-def load_df(path: str) -> pd.DataFrame:
-    return pd.read_parquet(path)
+def year_counts(year_range, col=None, top_n=None, selected_cat="All", selected_author="All") -> pd.DataFrame:
+    # Cached per filter tuple
+    keys = ["year", col] if col else ["year"]
+    expr = processed_filter(year_range, selected_cat, selected_author)
+    table = load_processed_dataset(PROCESSED_PATH).to_table(columns=keys, filter=expr)
+    # Grouped in Arrow
+    counts = (
+        table.group_by(keys).aggregate([([], "count_all")])
+        .rename_columns(keys + ["count"])
+        .to_pandas(types_mapper=arrow_dtype)
+        .dropna(subset=keys)
+        .sort_values(keys[::-1], ignore_index=True)
+    )
+    if top_n:
+        return top_n_year_series(counts, col, top_n)
+    return counts
+
+# Upper bound on the author dropdown (most reviewed first)
+TOP_N_AUTHORS = 300
 
 @st.cache_data
-def load_theme_csv(path: str) -> pd.DataFrame:
-    d = pd.read_csv(path)
-    d["year"] = pd.to_numeric(d["year"], errors="coerce")
-    d = d.dropna(subset=["year", "merged_category"]).copy()
-    d["year"] = d["year"].astype(int)
-    d["merged_category"] = d["merged_category"].astype(str).str.strip()
-    d = d[~d["merged_category"].str.lower().isin(BAD_THEME_CATS)]
-    d = d[d["merged_category"] != ""].reset_index(drop=True)
-    return d
+def load_filter_values(key: tuple, processed_key: tuple, columns: tuple) -> dict:
+    # Keyed on both files' mtimes
+    path, mtime = key
+    if mtime is not None:
+        # Long (column, value) table, each column's values in dropdown order
+        d = pd.read_parquet(path)
+        values = {c: v.tolist() for c, v in d.groupby("column", sort=False)["value"]}
+        years = [int(y) for y in values.pop("year", [])]
+        values["year"] = (min(years), max(years)) if years else None
+    else:
+        # No sidecar: derived from processed.parquet
+        d = load_processed(processed_key[0], columns)
+        # Year bounds only
+        years = d["year"].dropna()
+        values = {"year": (int(years.min()), int(years.max())) if len(years) else None}
+        for c in columns:
+            if c == "year":
+                continue
+            # Categoricals also list unused categories
+            counts = d[c].value_counts()
+            counts = counts[counts > 0]
+            values[c] = counts.index.tolist() if c == AUTHOR_COL else sorted(counts.index.tolist())
+    if AUTHOR_COL in values:
+        values[AUTHOR_COL] = values[AUTHOR_COL][:TOP_N_AUTHORS]
+    return values
 
 st.title("Amazon Books Reviews — Interactive Dashboard")
 
@@ -642,185 +801,201 @@ if not os.path.exists(PROCESSED_PATH):
     st.warning("Processed data not found. Run: python prepare_data.py")
     st.stop()
 
-df = load_df(PROCESSED_PATH)
+processed_ds = load_processed_dataset(PROCESSED_PATH)
+processed_cols = processed_ds.schema.names
 
-if "year" not in df.columns:
+if "year" not in processed_cols:
     st.error("Column 'year' not found in processed.parquet")
     st.stop()
 
-# ensure numeric year
-df["year"] = pd.to_numeric(df["year"], errors="coerce")
-
 # =========================
 # Sidebar filters (controls only)
 # =========================
 st.sidebar.header("Filters")
 
-years = sorted([int(y) for y in df["year"].dropna().unique().tolist()])
-if years:
-    y_min, y_max = int(min(years)), int(max(years))
-    year_range = st.sidebar.slider("Year range", y_min, y_max, (y_min, y_max), key="year_range")
+category_col = CATEGORY_COL if CATEGORY_COL in processed_cols else None
+author_col   = AUTHOR_COL if AUTHOR_COL in processed_cols else None
+
+filter_values = load_filter_values(
+    file_key(AGG_FILTER_VALUES),
+    file_key(PROCESSED_PATH),
+    tuple(c for c in ("year", category_col, author_col) if c),
+)
+
+# Submitted on "Apply" only
+filters = st.sidebar.form("filters")
+
+if filter_values.get("year"):
+    y_min, y_max = filter_values["year"]
+    year_range = filters.slider("Year range", y_min, y_max, (y_min, y_max), key="year_range")
 else:
     year_range = None
 
-category_col = "category_level_3_detail" if "category_level_3_detail" in df.columns else None
-author_col   = "author_name" if "author_name" in df.columns else None
-
 # Category filter
 if category_col:
-    cats = ["All"] + sorted(df[category_col].fillna("Unknown").unique().tolist())
-    selected_cat = st.sidebar.selectbox("Category", cats, index=0, key="selected_cat")
+    cats = ["All"] + filter_values.get(category_col, [])
+    selected_cat = filters.selectbox("Category", cats, index=0, key="selected_cat")
 else:
     selected_cat = "All"
 
 # Author filter (safe, avoids huge dropdown)
 if author_col:
-    st.sidebar.subheader("Author filter")
-    TOP_N_AUTHORS = 300
-
-    # build counts on year-filtered df later; for now use full df
-    author_counts_all = df[author_col].fillna("Unknown").value_counts()
-    top_authors_all = author_counts_all.head(TOP_N_AUTHORS).index.tolist()
-    authors = ["All"] + top_authors_all
-    selected_author = st.sidebar.selectbox("Author (Top 300)", authors, index=0, key="selected_author")
+    filters.subheader("Author filter")
+
+    # already the TOP_N_AUTHORS most reviewed, most reviewed first
+    authors = ["All"] + filter_values.get(author_col, [])
+    selected_author = filters.selectbox("Author (Top 300)", authors, index=0, key="selected_author")
 else:
     selected_author = "All"
 
-# =========================
-# Base filter: YEAR ONLY (affects everything)
-# =========================
-df_year = df.copy()
-if year_range:
-    df_year = df_year[(df_year["year"] >= year_range[0]) & (df_year["year"] <= year_range[1])]
-
-st.caption(f"Rows (year-filtered): {len(df_year):,}")
+filters.form_submit_button("Apply")
 
 # =========================
-# Separate dataframes per chart
+# Pre-aggregated global trends (year-only)
 # =========================
-df_for_category = df_year
-if category_col and selected_cat != "All":
-    df_for_category = df_year[df_year[category_col].fillna("Unknown") == selected_cat]
-
-df_for_author = df_year
-if author_col and selected_author != "All":
-    df_for_author = df_year[df_year[author_col].fillna("Unknown") == selected_author]
+# Wide per-year table, else the single-metric files
+if os.path.exists(AGG_YEAR):
+    (agg_year,) = load_aggregates((file_key(AGG_YEAR),))
+    agg_reviews = agg_rating = agg_sent = agg_helpful = agg_textlen = agg_price = agg_year
+else:
+    (agg_reviews, agg_rating, agg_sent,
+     agg_helpful, agg_textlen, agg_price) = load_aggregates(tuple(file_key(p) for p in (
+        AGG_REVIEWS_PER_YEAR,
+        AGG_RATING_PER_YEAR,
+        AGG_SENTIMENT_PER_YEAR,
+        AGG_HELPFUL_PER_YEAR,
+        AGG_TEXTLEN_PER_YEAR,
+        AGG_PRICE_PER_YEAR,
+    )))
+
+(agg_labels,
+ agg_top_cat, agg_top_title, agg_top_author,
+ agg_year_cat, agg_year_author) = load_aggregates(tuple(file_key(p) for p in (
+    AGG_SENTIMENT_LABELS,
+    AGG_TOP_CATEGORIES_YEAR,
+    AGG_TOP_TITLES_YEAR,
+    AGG_TOP_AUTHORS_YEAR,
+    AGG_YEAR_CATEGORY,
+    AGG_YEAR_AUTHOR,
+)))
+
+# Keyed on the file key and filters (_agg not hashed)
+@st.cache_data
+def sidecar_year_counts(_agg, key, year_range, col, top_n=None):
+    # Year slice of a (year, key, count) sidecar; None without it
+    if _agg is None or not {"year", col, "count"}.issubset(_agg.column_names):
+        return None
+    counts = year_slice(_agg, year_range).to_pandas(types_mapper=arrow_dtype)
+    if top_n:
+        counts = top_n_year_series(counts, col, top_n)
+    return counts
 
-df_for_sentiment = df_year
-df_for_books = df_year
+@st.cache_data
+def cube_key_counts(_agg, key, year_range, col, value):
+    # One key's (year, count) series from a cube; None without it
+    if _agg is None or not {"year", col, "count"}.issubset(_agg.column_names):
+        return None
+    t = year_slice(_agg, year_range)
+    t = t.filter(pc.equal(t[col], value))
+    return t.select(["year", "count"]).sort_by("year").to_pandas()
+
+# Figures cached as plain dicts
+@st.cache_data(max_entries=64)
+def webgl_lines(grp: pd.DataFrame, col: str, title: str) -> dict:
+    # One Scattergl trace per series
+    fig = go.Figure()
+    for k, sub in grp.groupby(col, observed=True, sort=False):
+        fig.add_trace(go.Scattergl(x=sub["year"], y=sub["count"], mode="lines+markers", name=str(k)))
+    fig.update_layout(title=title, xaxis_title="year", yaxis_title="count", legend_title_text=col)
+    return fig.to_dict()
+
+@st.cache_data(max_entries=64)
+def count_lines(grp: pd.DataFrame, title: str, color=None) -> dict:
+    return px.line(grp, x="year", y="count", color=color, markers=True, render_mode="webgl", title=title).to_dict()
 
 # =========================
-# Pre-aggregated global trends (year-only)
+# Base filter: YEAR ONLY (affects everything)
 # =========================
-agg_reviews = load_df(AGG_REVIEWS_PER_YEAR) if os.path.exists(AGG_REVIEWS_PER_YEAR) else None
-agg_rating  = load_df(AGG_RATING_PER_YEAR) if os.path.exists(AGG_RATING_PER_YEAR) else None
-agg_sent    = load_df(AGG_SENTIMENT_PER_YEAR) if os.path.exists(AGG_SENTIMENT_PER_YEAR) else None
-agg_labels  = load_df(AGG_SENTIMENT_LABELS) if os.path.exists(AGG_SENTIMENT_LABELS) else None
-agg_helpful = load_df(AGG_HELPFUL_PER_YEAR) if os.path.exists(AGG_HELPFUL_PER_YEAR) else None
-agg_textlen = load_df(AGG_TEXTLEN_PER_YEAR) if os.path.exists(AGG_TEXTLEN_PER_YEAR) else None
-agg_price   = load_df(AGG_PRICE_PER_YEAR) if os.path.exists(AGG_PRICE_PER_YEAR) else None
-
-def apply_year_filter(agg: pd.DataFrame, year_col="year"):
-    if agg is None or not year_range:
-        return agg
-    if year_col not in agg.columns:
-        return agg
-    agg2 = agg.copy()
-    agg2[year_col] = pd.to_numeric(agg2[year_col], errors="coerce")
-    return agg2[(agg2[year_col] >= year_range[0]) & (agg2[year_col] <= year_range[1])]
-
-col1, col2 = st.columns(2)
-
-with col1:
-    if agg_reviews is not None and {"year", "review_count"}.issubset(agg_reviews.columns):
-        a = apply_year_filter(agg_reviews)
-        fig = px.bar(a, x="year", y="review_count", title="Number of Reviews Per Year")
-        st.plotly_chart(fig, width="stretch", key="reviews_per_year")
-
-    if agg_textlen is not None and {"year", "avg_text_len"}.issubset(agg_textlen.columns):
-        a = apply_year_filter(agg_textlen)
-        fig = px.line(a, x="year", y="avg_text_len", markers=True, title="Average Review Length by Year")
-        st.plotly_chart(fig, width="stretch", key="avg_text_len_per_year")
-
-    if agg_helpful is not None and {"year", "avg_helpful_vote"}.issubset(agg_helpful.columns):
-        a = apply_year_filter(agg_helpful)
-        fig = px.line(a, x="year", y="avg_helpful_vote", markers=True, title="Average Helpful Votes by Year")
-        st.plotly_chart(fig, width="stretch", key="avg_helpful_votes_per_year")
-
-with col2:
-    if agg_rating is not None and {"year", "avg_rating"}.issubset(agg_rating.columns):
-        a = apply_year_filter(agg_rating)
-        fig = px.line(a, x="year", y="avg_rating", markers=True, title="Average Rating Per Year")
-        st.plotly_chart(fig, width="stretch", key="avg_rating_per_year")
-
-    if agg_sent is not None and {"year", "avg_sentiment"}.issubset(agg_sent.columns):
-        a = apply_year_filter(agg_sent)
-        fig = px.line(a, x="year", y="avg_sentiment", markers=True, title="Average Sentiment Score Per Year")
-        st.plotly_chart(fig, width="stretch", key="avg_sentiment_per_year")
-
-    if agg_price is not None and {"year", "avg_price"}.issubset(agg_price.columns):
-        a = apply_year_filter(agg_price)
-        fig = px.line(a, x="year", y="avg_price", markers=True, title="Average Book Price")
-        st.plotly_chart(fig, width="stretch", key="avg_price_per_year")
-
+# From the per-year review counts, else counted in processed.parquet
+if agg_reviews is not None and "review_count" in agg_reviews.column_names:
+    n_rows_year = pc.sum(year_slice(agg_reviews, year_range)["review_count"]).as_py() or 0
+else:
+    n_rows_year = processed_ds.count_rows(filter=processed_filter(year_range))
+
+st.caption(f"Rows (year-filtered): {n_rows_year:,}")
+
+# Prebuilt figure for the full range, else built from the sliced aggregates
+trends_fig = global_trends_fig([agg_reviews, agg_rating, agg_textlen, agg_sent, agg_helpful, agg_price], tuple(file_key(p) for p in (
+    AGG_YEAR,
+    AGG_REVIEWS_PER_YEAR,
+    AGG_RATING_PER_YEAR,
+    AGG_SENTIMENT_PER_YEAR,
+    AGG_HELPFUL_PER_YEAR,
+    AGG_TEXTLEN_PER_YEAR,
+    AGG_PRICE_PER_YEAR,
+)), FIG_TRENDS, year_range, filter_values.get("year"))
+st.plotly_chart(trends_fig, width="stretch", key="global_trends")
 st.divider()
 
 # =========================
 # Category popularity over years
 # =========================
-if category_col and len(df_for_category) > 0:
+if category_col:
     if selected_cat == "All":
-        top_l3 = df_for_category[category_col].fillna("Unknown").value_counts().head(10).index.tolist()
-        df_l3 = df_for_category[df_for_category[category_col].fillna("Unknown").isin(top_l3)]
-        if len(df_l3) > 0:
-            grp = df_l3.groupby(["year", category_col]).size().rename("count").reset_index()
-            fig = px.line(grp, x="year", y="count", color=category_col, markers=True,
-                          title="Category Popularity Over Years (Top 10)")
+        grp = sidecar_year_counts(agg_top_cat, file_key(AGG_TOP_CATEGORIES_YEAR), year_range, category_col, top_n=10)
+        if grp is None:
+            grp = year_counts(year_range, category_col, top_n=10)
+        if len(grp) > 0:
+            fig = webgl_lines(grp, category_col, "Category Popularity Over Years (Top 10)")
             st.plotly_chart(fig, width="stretch", key="category_popularity_top10")
     else:
-        grp = df_for_category.groupby(["year"]).size().rename("count").reset_index()
-        fig = px.line(grp, x="year", y="count", markers=True,
-                      title=f"Category Popularity Over Years — {selected_cat}")
-        st.plotly_chart(fig, width="stretch", key="category_popularity_selected")
+        grp = cube_key_counts(agg_year_cat, file_key(AGG_YEAR_CATEGORY), year_range, category_col, selected_cat)
+        if grp is None:
+            grp = year_counts(year_range, selected_cat=selected_cat)
+        if len(grp) > 0:
+            fig = count_lines(grp, f"Category Popularity Over Years — {selected_cat}")
+            st.plotly_chart(fig, width="stretch", key="category_popularity_selected")
 
 # =========================
 # Sentiment label trends (year only)
 # =========================
-if "sentiment_label" in df_for_sentiment.columns and len(df_for_sentiment) > 0:
-    grp = df_for_sentiment.groupby(["year", "sentiment_label"]).size().rename("count").reset_index()
-    fig = px.line(grp, x="year", y="count", color="sentiment_label", markers=True,
-                  title="Sentiment Label Trends Over Years (Year only)")
-    st.plotly_chart(fig, width="stretch", key="sentiment_label_trends")
+if "sentiment_label" in processed_cols:
+    grp = sidecar_year_counts(agg_labels, file_key(AGG_SENTIMENT_LABELS), year_range, "sentiment_label")
+    if grp is None:
+        grp = year_counts(year_range, "sentiment_label")
+    if len(grp) > 0:
+        fig = count_lines(grp, "Sentiment Label Trends Over Years (Year only)", color="sentiment_label")
+        st.plotly_chart(fig, width="stretch", key="sentiment_label_trends")
 
 # =========================
 # Top 10 Books — popularity over years (year only)
 # =========================
-if "title" in df_for_books.columns and len(df_for_books) > 0:
-    top_books = df_for_books["title"].fillna("Unknown").value_counts().head(10).index.tolist()
-    df_tb = df_for_books[df_for_books["title"].fillna("Unknown").isin(top_books)]
-    if len(df_tb) > 0:
-        grp = df_tb.groupby(["year", "title"]).size().rename("count").reset_index()
-        fig = px.line(grp, x="year", y="count", color="title", markers=True,
-                      title="Top 10 Books — Popularity Over the Years")
+if "title" in processed_cols:
+    grp = sidecar_year_counts(agg_top_title, file_key(AGG_TOP_TITLES_YEAR), year_range, "title", top_n=10)
+    if grp is None:
+        grp = year_counts(year_range, "title", top_n=10)
+    if len(grp) > 0:
+        fig = webgl_lines(grp, "title", "Top 10 Books — Popularity Over the Years")
         st.plotly_chart(fig, width="stretch", key="top10_books_popularity")
 
 # =========================
 # Top 10 Authors — popularity over years
 # =========================
-if author_col and len(df_for_author) > 0:
+if author_col:
     if selected_author == "All":
-        top_auth = df_for_author[author_col].fillna("Unknown").value_counts().head(10).index.tolist()
-        df_ta = df_for_author[df_for_author[author_col].fillna("Unknown").isin(top_auth)]
-        if len(df_ta) > 0:
-            grp = df_ta.groupby(["year", author_col]).size().rename("count").reset_index()
-            fig = px.line(grp, x="year", y="count", color=author_col, markers=True,
-                          title="Top 10 Authors — Popularity Over the Years")
+        grp = sidecar_year_counts(agg_top_author, file_key(AGG_TOP_AUTHORS_YEAR), year_range, author_col, top_n=10)
+        if grp is None:
+            grp = year_counts(year_range, author_col, top_n=10)
+        if len(grp) > 0:
+            fig = webgl_lines(grp, author_col, "Top 10 Authors — Popularity Over the Years")
             st.plotly_chart(fig, width="stretch", key="top10_authors_popularity")
     else:
-        grp = df_for_author.groupby(["year"]).size().rename("count").reset_index()
-        fig = px.line(grp, x="year", y="count", markers=True,
-                      title=f"Author Popularity Over the Years — {selected_author}")
-        st.plotly_chart(fig, width="stretch", key="author_popularity_selected")
+        grp = cube_key_counts(agg_year_author, file_key(AGG_YEAR_AUTHOR), year_range, author_col, selected_author)
+        if grp is None:
+            grp = year_counts(year_range, selected_author=selected_author)
+        if len(grp) > 0:
+            fig = count_lines(grp, f"Author Popularity Over the Years — {selected_author}")
+            st.plotly_chart(fig, width="stretch", key="author_popularity_selected")
 
 st.divider()
 
@@ -829,91 +1004,42 @@ st.divider()
 # =========================
 st.header("Thematic Categories")
 
-if not os.path.exists(THEME_CSV):
-    st.warning(f"Thematic CSV not found: {THEME_CSV}")
-else:
-    theme_df = load_theme_csv(THEME_CSV)
+@st.fragment
+def theme_section(theme_src: tuple):
+    # Fragment: the thematic controls rerun only this section
+    theme_counts_all = theme_year_counts(*theme_src)
 
-    with st.sidebar.expander("Thematic Categories", expanded=False):
+    with st.expander("Thematic filters", expanded=False):
         theme_top_n = st.slider("Top N thematic categories", 5, 28, 20, 1, key="theme_top_n")
-        tmin, tmax = int(theme_df["year"].min()), int(theme_df["year"].max())
-        theme_year_range = st.slider(
-            "Thematic year range",
-            tmin, tmax,
-            (tmin, tmax),
-            1,
-            key="theme_year_range",
-        )
-
-    theme_df_f = theme_df[
-        (theme_df["year"] >= theme_year_range[0]) &
-        (theme_df["year"] <= theme_year_range[1])
-    ].copy()
-
-    st.caption(f"Thematic rows: {len(theme_df_f):,}")
-
-    theme_overall_counts = theme_df_f["merged_category"].value_counts()
-    theme_top_cats = theme_overall_counts.head(theme_top_n).index.tolist()
-
-    theme_df_top = theme_df_f[theme_df_f["merged_category"].isin(theme_top_cats)].copy()
-
-    theme_counts_long = (
-        theme_df_top.groupby(["year", "merged_category"])
-        .size()
-        .reset_index(name="count")
-    )
+        tmin, tmax = int(theme_counts_all["year"].min()), int(theme_counts_all["year"].max())
+        theme_year_range = st.slider("Thematic year range", tmin, tmax, (tmin, tmax), 1, key="theme_year_range")
 
-    theme_counts_pivot = (
-        theme_counts_long.pivot(index="year", columns="merged_category", values="count")
-        .fillna(0)
-        .sort_index()
-    )
+    theme_rows = theme_row_total(*theme_src, theme_year_range)
 
-    tab1, tab2, tab3 = st.tabs(["Line (log)", "Stacked proportions", "Heatmap"])
+    st.caption(f"Thematic rows: {theme_rows:,}")
 
-    with tab1:
+    # Only the selected view is built
+    theme_view = st.radio(
+        "Thematic chart",
+        ["Line (log)", "Stacked proportions", "Heatmap"],
+        horizontal=True,
+        label_visibility="collapsed",
+        key="theme_view",
+    )
+
+    fig = theme_view_fig(*theme_src, theme_year_range, theme_top_n, theme_view)
+    if theme_view == "Line (log)":
         st.subheader("Review Counts per Thematic Category over Years (log scale)")
-        fig_line = px.line(
-            theme_counts_long,
-            x="year",
-            y="count",
-            color="merged_category",
-            markers=True,
-        )
-        fig_line.update_yaxes(type="log", title="Number of Reviews (log)")
-        fig_line.update_xaxes(title="Year")
-        fig_line.update_layout(legend_title_text="Thematic Category", height=600)
-        st.plotly_chart(fig_line, width="stretch", key="theme_line_log")
-
-    with tab2:
+        st.plotly_chart(fig, width="stretch", key="theme_line_log")
+    elif theme_view == "Stacked proportions":
         st.subheader("Thematic Category Proportions per Year (stacked)")
-        year_totals = theme_counts_pivot.sum(axis=1).replace(0, 1)
-        theme_props_pivot = theme_counts_pivot.div(year_totals, axis=0)
-
-        theme_props_long = (
-            theme_props_pivot.reset_index()
-            .melt(id_vars="year", var_name="merged_category", value_name="proportion")
-        )
-
-        fig_stack = px.bar(
-            theme_props_long,
-            x="year",
-            y="proportion",
-            color="merged_category",
-            barmode="stack",
-        )
-        fig_stack.update_yaxes(title="Proportion")
-        fig_stack.update_xaxes(title="Year")
-        fig_stack.update_layout(legend_title_text="Thematic Category", height=600)
-        st.plotly_chart(fig_stack, width="stretch", key="theme_stacked_props")
-
-    with tab3:
+        st.plotly_chart(fig, width="stretch", key="theme_stacked_props")
+    else:
         st.subheader("Counts Heatmap (Year × Thematic Category)")
-        fig_heat = px.imshow(
-            theme_counts_pivot,
-            aspect="auto",
-            labels=dict(x="Thematic Category", y="Year", color="Count"),
-        )
-        fig_heat.update_layout(height=650)
-        st.plotly_chart(fig_heat, width="stretch", key="theme_heatmap")
+        st.plotly_chart(fig, width="stretch", key="theme_heatmap")
 
+theme_src = theme_key()
+if theme_src[1] is None:
+    st.warning(f"Thematic data not found: {AGG_THEME_YEAR_CATEGORY} (or {THEME_PARQUET}, {THEME_CSV})")
+else:
+    theme_section(theme_src)
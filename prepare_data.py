@@ -1,21 +1,91 @@
 import os
+import multiprocessing as mp
+import numpy as np
 import pandas as pd
 import kagglehub
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.csv as pacsv
+import pyarrow.parquet as pq
 
 import nltk
 from nltk.sentiment import SentimentIntensityAnalyzer
 
+from common import (
+    AGG_THEME_YEAR_CATEGORY,
+    THEME_CSV,
+    THEME_PARQUET,
+    TREND_PANELS,
+    clean_theme_csv,
+    count_theme_rows,
+    trends_figure,
+)
+
 DATA_DIR = os.path.join(os.path.dirname(__file__), "data")
 os.makedirs(DATA_DIR, exist_ok=True)
 
 PROCESSED_PATH = os.path.join(DATA_DIR, "processed.parquet")
-AGG_REVIEWS_PER_YEAR = os.path.join(DATA_DIR, "agg_reviews_per_year.parquet")
-AGG_RATING_PER_YEAR = os.path.join(DATA_DIR, "agg_rating_per_year.parquet")
-AGG_SENTIMENT_PER_YEAR = os.path.join(DATA_DIR, "agg_sentiment_per_year.parquet")
 AGG_SENTIMENT_LABELS = os.path.join(DATA_DIR, "agg_sentiment_labels.parquet")
-AGG_HELPFUL_PER_YEAR = os.path.join(DATA_DIR, "agg_helpful_per_year.parquet")
-AGG_TEXTLEN_PER_YEAR = os.path.join(DATA_DIR, "agg_textlen_per_year.parquet")
-AGG_PRICE_PER_YEAR = os.path.join(DATA_DIR, "agg_price_per_year.parquet")
+AGG_YEAR = os.path.join(DATA_DIR, "agg_year.parquet")
+AGG_FILTER_VALUES = os.path.join(DATA_DIR, "agg_filter_values.parquet")
+AGG_TOP_CATEGORIES_YEAR = os.path.join(DATA_DIR, "agg_top_categories_year.parquet")
+AGG_TOP_TITLES_YEAR = os.path.join(DATA_DIR, "agg_top_titles_year.parquet")
+AGG_TOP_AUTHORS_YEAR = os.path.join(DATA_DIR, "agg_top_authors_year.parquet")
+AGG_YEAR_CATEGORY = os.path.join(DATA_DIR, "agg_year_category.parquet")
+AGG_YEAR_AUTHOR = os.path.join(DATA_DIR, "agg_year_author.parquet")
+
+# Keys kept per Top-N sidecar; the dashboard picks its Top 10 for the chosen years from these
+TOP_N_SIDECAR = 50
+
+# Authors listed in the filter sidecar (the dashboard's author dropdown shows this many)
+TOP_N_AUTHORS = 300
+
+# Columns kept in processed.parquet (the dashboard filters/groups on these; text is aggregated here)
+PROCESSED_COLUMNS = [
+    "parent_asin",
+    "year",
+    "rating",
+    "helpful_vote",
+    "text_len",
+    "sentiment",
+    "sentiment_label",
+    "price_numeric",
+    "category_level_3_detail",
+    "author_name",
+    "title",
+]
+
+# On-disk dtypes of the numeric processed columns (the dashboard reads them at these widths)
+PROCESSED_TYPES = {
+    "year": "Int16",
+    "rating": "float32",
+    "helpful_vote": "Int32",
+    "text_len": "int32",
+    "sentiment": "float32",
+    "price_numeric": "float32",
+}
+
+# Rows per processed.parquet row group; with rows sorted by year, each group spans a narrow
+# year range, so the dashboard's year filter skips whole groups from their min/max statistics
+PROCESSED_ROW_GROUP_SIZE = 50_000
+
+# Below this many reviews, starting worker processes costs more than it saves
+SENTIMENT_MIN_PARALLEL = 10_000
+
+# Parquet write options for every file written here; zstd decodes as fast as snappy at a smaller size
+PARQUET_OPTS = {"index": False, "compression": "zstd"}
+
+FIG_TRENDS = os.path.join(DATA_DIR, "fig_trends.json")
+
+def read_csv(path: str, column_types: dict) -> pd.DataFrame:
+    # Arrow CSV reader; quoted review text may span lines
+    t = pacsv.read_csv(
+        path,
+        read_options=pacsv.ReadOptions(block_size=64 << 20),
+        parse_options=pacsv.ParseOptions(newlines_in_values=True),
+        convert_options=pacsv.ConvertOptions(column_types=column_types, strings_can_be_null=True),
+    )
+    return t.to_pandas()
 
 def ensure_vader():
     try:
@@ -23,12 +93,67 @@ def ensure_vader():
     except LookupError:
         nltk.download("vader_lexicon")
 
-def label_sentiment(score: float) -> str:
-    if score > 0.05:
-        return "Positive"
-    if score < -0.05:
-        return "Negative"
-    return "Neutral"
+def score_texts(texts) -> np.ndarray:
+    # VADER compound score per text
+    out = np.empty(len(texts), dtype=np.float64)
+    polarity_scores = SentimentIntensityAnalyzer().polarity_scores
+    for i, t in enumerate(texts):
+        out[i] = polarity_scores(t)["compound"]
+    return out
+
+def score_sentiment(texts) -> np.ndarray:
+    # Score each distinct text once
+    codes, uniques = pd.factorize(texts)
+    uniques = np.asarray(uniques, dtype=object)
+    # Split over worker processes (VADER is pure Python)
+    n = os.cpu_count() or 1
+    if n == 1 or len(uniques) < SENTIMENT_MIN_PARALLEL:
+        scores = score_texts(uniques)
+    else:
+        with mp.Pool(n) as pool:
+            scores = np.concatenate(pool.map(score_texts, np.array_split(uniques, n * 4)))
+    return scores[codes]
+
+def label_sentiment(scores: np.ndarray) -> pd.Categorical:
+    # VADER's usual +/-0.05 cut-offs, as category codes 0/1/2
+    codes = np.ones(len(scores), dtype=np.int8)
+    codes += scores > 0.05
+    codes -= scores < -0.05
+    return pd.Categorical.from_codes(codes, categories=["Negative", "Neutral", "Positive"])
+
+def write_agg(frame: pd.DataFrame, path: str):
+    # Written narrow: int16 years, int32 counts, float32 means
+    types = {c: "int32" for c in frame.select_dtypes("int64").columns}
+    types.update({c: "float32" for c in frame.select_dtypes("float64").columns})
+    types["year"] = "int16"  # NaN years never reach an aggregate (group-by drops them)
+    frame.astype(types).to_parquet(path, **PARQUET_OPTS)
+
+def year_key_counts(df: pd.DataFrame, col: str) -> pd.DataFrame:
+    # (year, key, count) via Arrow's group-by
+    t = pa.Table.from_pandas(df[["year", col]], preserve_index=False)
+    t = t.filter(pc.is_valid(t["year"]))  # pandas' group-by drops NaN years too
+    return (
+        t.group_by(["year", col]).aggregate([([], "count_all")])
+        .rename_columns(["year", col, "count"])
+        .to_pandas()
+        .sort_values(["year", col], ignore_index=True)
+    )
+
+def year_topk(cube: pd.DataFrame, col: str, k: int) -> pd.DataFrame:
+    # Top k keys by total count
+    totals = cube.groupby(col, observed=True)["count"].sum()
+    return cube[cube[col].isin(totals.nlargest(k).index)]
+
+def write_trend_figure():
+    a = pd.read_parquet(AGG_YEAR)
+    a["year"] = a["year"].astype(int)
+    with open(FIG_TRENDS, "w") as f:
+        f.write(trends_figure([a] * len(TREND_PANELS)).to_json())
+
+def write_theme_parquet():
+    clean = clean_theme_csv(THEME_CSV)
+    pq.write_table(clean, THEME_PARQUET, compression="zstd", use_dictionary=True)
+    write_agg(count_theme_rows(clean), AGG_THEME_YEAR_CATEGORY)
 
 def main():
     print("Downloading dataset via kagglehub...")
@@ -38,22 +163,32 @@ def main():
     meta_path    = os.path.join(path, "amazon_books_metadata_sample_20k.csv")
 
     print("Loading CSVs...")
-    df_reviews = pd.read_csv(reviews_path)
-    df_meta    = pd.read_csv(meta_path)
+    df_reviews = read_csv(reviews_path, {
+        "parent_asin": pa.string(),
+        "date": pa.string(),
+        "text": pa.large_string(),
+    })
+    df_meta = read_csv(meta_path, {
+        "parent_asin": pa.string(),
+        "price_numeric": pa.float64(),
+        "category_level_3_detail": pa.string(),
+        "author_name": pa.string(),
+        "title": pa.string(),
+    })
 
     # Date/year
-    df_reviews["date"] = pd.to_datetime(df_reviews.get("date"), errors="coerce")
+    df_reviews["date"] = pd.to_datetime(df_reviews.get("date"), format="ISO8601", errors="coerce", cache=True)
     df_reviews["year"] = df_reviews["date"].dt.year
 
     # Review length
-    df_reviews["text"] = df_reviews.get("text").astype(str)
-    df_reviews["text_len"] = df_reviews["text"].str.len()
+    df_reviews["text"] = df_reviews.get("text").fillna("").astype(str)
+    text = pa.array(df_reviews["text"].to_numpy(), type=pa.large_string())
+    df_reviews["text_len"] = pc.utf8_length(text).to_numpy().astype(np.int32)
 
     # Sentiment
     ensure_vader()
-    sia = SentimentIntensityAnalyzer()
-    df_reviews["sentiment"] = df_reviews["text"].apply(lambda x: sia.polarity_scores(x)["compound"])
-    df_reviews["sentiment_label"] = df_reviews["sentiment"].apply(label_sentiment)
+    df_reviews["sentiment"] = score_sentiment(df_reviews["text"].to_numpy())
+    df_reviews["sentiment_label"] = label_sentiment(df_reviews["sentiment"].to_numpy())
 
     # Merge metadata (include what you need)
     keep_cols = [c for c in [
@@ -64,7 +199,14 @@ def main():
         "title"
     ] if c in df_meta.columns]
 
-    df = df_reviews.merge(df_meta[keep_cols], on="parent_asin", how="left")
+    meta = df_meta[keep_cols]
+    # Unique book keys and no other shared columns: the left merge is a plain lookup
+    if meta["parent_asin"].is_unique and set(meta.columns) & set(df_reviews.columns) == {"parent_asin"}:
+        pos = pc.index_in(pa.array(df_reviews["parent_asin"]), value_set=pa.array(meta["parent_asin"]))
+        looked_up = pa.Table.from_pandas(meta.drop(columns="parent_asin"), preserve_index=False).take(pos)
+        df = pd.concat([df_reviews, looked_up.to_pandas()], axis=1)
+    else:
+        df = df_reviews.merge(meta, on="parent_asin", how="left")
 
     # Clean a few fields
     if "category_level_3_detail" in df.columns:
@@ -74,29 +216,75 @@ def main():
     if "title" in df.columns:
         df["title"] = df["title"].fillna("Unknown Title")
 
+    # Low-cardinality strings as category: stored dictionary-encoded, read back as categoricals
+    for c in ("category_level_3_detail", "author_name", "title", "sentiment_label"):
+        if c in df.columns:
+            df[c] = df[c].astype("category")
+
+    # Sort by year once (stable)
+    df = df.sort_values("year", kind="stable", ignore_index=True)
+
     # Save processed
     print(f"Writing {PROCESSED_PATH} ...")
-    df.to_parquet(PROCESSED_PATH, index=False)
+    # Raw review text/date stay out: every per-row use downstream is covered by these columns
+    processed = df[[c for c in PROCESSED_COLUMNS if c in df.columns]]
+    # Narrow numerics on disk (nullable ints where values may be missing); aggregates below are
+    # still computed from the full-precision frame
+    processed = processed.astype({c: t for c, t in PROCESSED_TYPES.items() if c in processed.columns})
+    processed.to_parquet(
+        PROCESSED_PATH,
+        row_group_size=PROCESSED_ROW_GROUP_SIZE,
+        write_statistics=True,
+        write_page_index=True,
+        compression_level=5,
+        **PARQUET_OPTS,
+    )
 
     # Aggregations (fast charts)
     print("Writing aggregates...")
 
-    df.groupby("year").size().rename("review_count").reset_index().to_parquet(AGG_REVIEWS_PER_YEAR, index=False)
-
-    if "rating" in df.columns:
-        df.groupby("year")["rating"].mean().rename("avg_rating").reset_index().to_parquet(AGG_RATING_PER_YEAR, index=False)
+    # Every per-year metric from one group-by, as one wide table
+    metrics = {"review_count": ("year", "size"), "avg_sentiment": ("sentiment", "mean"), "avg_text_len": ("text_len", "mean")}
+    for col, name in (("rating", "avg_rating"), ("helpful_vote", "avg_helpful_vote"), ("price_numeric", "avg_price")):
+        if col in df.columns:
+            metrics[name] = (col, "mean")
+    write_agg(df.groupby("year", sort=False).agg(**metrics).reset_index(), AGG_YEAR)
 
-    df.groupby("year")["sentiment"].mean().rename("avg_sentiment").reset_index().to_parquet(AGG_SENTIMENT_PER_YEAR, index=False)
+    write_agg(year_key_counts(df, "sentiment_label"), AGG_SENTIMENT_LABELS)
 
-    df.groupby(["year", "sentiment_label"]).size().rename("count").reset_index().to_parquet(AGG_SENTIMENT_LABELS, index=False)
+    # (year, key, count) per dimension from one group-by each: the full cube backs the
+    # single-category / single-author views, its top keys the Top-N-over-years sidecar
+    for col, cube_path, top_path in (
+        ("category_level_3_detail", AGG_YEAR_CATEGORY, AGG_TOP_CATEGORIES_YEAR),
+        ("title", None, AGG_TOP_TITLES_YEAR),
+        ("author_name", AGG_YEAR_AUTHOR, AGG_TOP_AUTHORS_YEAR),
+    ):
+        if col not in df.columns:
+            continue
+        # (year int16, key dictionary, count int32) once written
+        cube = year_key_counts(df, col)
+        if cube_path:
+            write_agg(cube, cube_path)
+        write_agg(year_topk(cube, col, TOP_N_SIDECAR), top_path)
 
-    if "helpful_vote" in df.columns:
-        df.groupby("year")["helpful_vote"].mean().rename("avg_helpful_vote").reset_index().to_parquet(AGG_HELPFUL_PER_YEAR, index=False)
+    # Distinct sidebar filter values as a long (column, value) table in dropdown order: years
+    # ascending, categories sorted, the TOP_N_AUTHORS most reviewed authors first
+    filter_values = {"year": np.unique(df["year"].dropna().to_numpy(dtype=int))}
+    if "category_level_3_detail" in df.columns:
+        filter_values["category_level_3_detail"] = sorted(df["category_level_3_detail"].unique())
+    if "author_name" in df.columns:
+        filter_values["author_name"] = df["author_name"].value_counts().index[:TOP_N_AUTHORS]
+    pd.concat(
+        [pd.DataFrame({"column": c, "value": pd.Series(v, dtype=str)}) for c, v in filter_values.items()],
+        ignore_index=True,
+    ).to_parquet(AGG_FILTER_VALUES, **PARQUET_OPTS)
 
-    df.groupby("year")["text_len"].mean().rename("avg_text_len").reset_index().to_parquet(AGG_TEXTLEN_PER_YEAR, index=False)
+    print("Writing trend figure...")
+    write_trend_figure()
 
-    if "price_numeric" in df.columns:
-        df.groupby("year")["price_numeric"].mean().rename("avg_price").reset_index().to_parquet(AGG_PRICE_PER_YEAR, index=False)
+    if os.path.exists(THEME_CSV):
+        print(f"Writing {THEME_PARQUET} and {AGG_THEME_YEAR_CATEGORY} ...")
+        write_theme_parquet()
 
     print("Done.")
 